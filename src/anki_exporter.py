@@ -4,13 +4,34 @@ Anki导出模块 - 使用AnkiConnect自动添加卡片
 import requests
 import json
 
+from src.card_scorer import CardScorer
+from src.note_index import NoteIndex
+
 class AnkiExporter:
     def __init__(self, deck_name, ankiconnect_url='http://localhost:8765',
-                 model_name='问答题', tags=None):
+                 model_name='问答题', tags=None, cassette=None, index_path=None):
         self.deck_name = deck_name
         self.ankiconnect_url = ankiconnect_url
         self.model_name = model_name
         self.tags = tags or []
+        # 传入 Cassette 时通过它录制/回放请求
+        self.http = cassette if cassette is not None else requests
+        # 配置索引后，同一笔记段落重新生成的卡片会原地更新而不是重复添加
+        self.index = self._load_index(index_path, cassette)
+
+    def _load_index(self, index_path, cassette):
+        """
+        加载卡片映射索引
+        录制时把索引快照写入录制文件；回放时使用快照且只保存在内存中，不读写磁盘上的索引
+        """
+        if not index_path:
+            return None
+        if cassette is None:
+            return NoteIndex(index_path)
+
+        data = cassette.call('note_index', {'path': index_path}, lambda: NoteIndex(index_path).data)
+        path = index_path if cassette.mode == 'record' else None
+        return NoteIndex(path, data=data)
 
     def _invoke(self, action, **params):
         """
@@ -26,7 +47,7 @@ class AnkiExporter:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.ankiconnect_url,
                 json=payload,
                 timeout=10,
@@ -41,6 +62,18 @@ class AnkiExporter:
         except Exception as e:
             raise Exception(f"AnkiConnect调用失败: {e}")
 
+    def _invoke_multi(self, actions):
+        """
+        通过 multi 一次请求执行多个动作
+        :param actions: [(action, params), ...]
+        :return: 每个动作的错误信息列表，成功为None
+        """
+        results = self._invoke('multi', actions=[
+            {'action': action, 'version': 6, 'params': params}
+            for action, params in actions
+        ])
+        return [r.get('error') if isinstance(r, dict) else None for r in results]
+
     def test_connection(self):
         """测试AnkiConnect连接"""
         try:
@@ -57,6 +90,12 @@ class AnkiExporter:
             print(f"  创建牌组: {self.deck_name}")
         return True
 
+    def _fields(self, question, answer):
+        return {
+            '正面': question,
+            '背面': answer
+        }
+
     def add_note(self, question, answer):
         """
         添加单个笔记到Anki
@@ -65,10 +104,7 @@ class AnkiExporter:
         note = {
             'deckName': self.deck_name,
             'modelName': self.model_name,
-            'fields': {
-                '正面': question,
-                '背面': answer
-            },
+            'fields': self._fields(question, answer),
             'tags': self.tags,
             'options': {
                 'allowDuplicate': False,  # 不允许重复
@@ -84,8 +120,29 @@ class AnkiExporter:
                 return None
             raise e
 
-    def export(self, qa_pairs):
-        """批量添加卡片到Anki"""
+    def get_notes_fields(self, note_ids):
+        """
+        批量获取笔记字段，已在Anki中删除的笔记不会出现在结果中
+        返回: {note_id: {'正面': ..., '背面': ...}}
+        """
+        note_ids = [note_id for note_id in note_ids if note_id]
+        if not note_ids:
+            return {}
+
+        infos = self._invoke('notesInfo', notes=note_ids)
+        return {
+            info['noteId']: {name: field['value'] for name, field in info['fields'].items()}
+            for info in infos if info and 'noteId' in info
+        }
+
+    def export(self, qa_pairs, source_note_id=None, section='', section_content=None):
+        """
+        批量添加卡片到Anki
+        配置了索引且提供 source_note_id 时，按 (笔记, 段落) 查找上次导出的卡片：
+        - 段落内容（section_content）未变化：不做任何修改
+        - 段落内容有变化：新卡片按相似度与旧卡片配对，配对成功的原地更新（保留复习记录），
+          未配对的新卡片添加，未配对的旧卡片删除
+        """
         # 1.测试链接
         print("  测试AnkiConnect连接...")
         self.test_connection()
@@ -94,16 +151,55 @@ class AnkiExporter:
         print(f"  检查牌组 '{self.deck_name}'...")
         self.ensure_deck_exists()
 
+        use_index = self.index is not None and source_note_id is not None
+        content_hash = NoteIndex.hash_content(section_content)
+        existing_ids = self.index.get(source_note_id, section) if use_index else []
+
+        if existing_ids and content_hash is not None \
+                and self.index.get_hash(source_note_id, section) == content_hash:
+            unchanged = len([note_id for note_id in existing_ids if note_id])
+            print(f"  段落内容未变化，保留已有的 {unchanged} 个卡片")
+            return {
+                'total': len(qa_pairs),
+                'added': 0,
+                'updated': 0,
+                'unchanged': unchanged,
+                'deleted': 0,
+                'skipped': 0,
+                'failed': 0,
+            }
+
+        existing_fields = self.get_notes_fields(existing_ids)
+        old_ids = [note_id for note_id in existing_ids if note_id in existing_fields]
+        matches = self._match_existing(qa_pairs, old_ids, existing_fields, section_content)
+
         # 3. 添加卡片
         print(f"  开始添加 {len(qa_pairs)} 个卡片...")
 
         added = 0
         skipped = 0
         failed = 0
+        updated = 0
+        unchanged = 0
+        new_ids = []
+        updates = []
 
         for i, qa in enumerate(qa_pairs, 1):
+            fields = self._fields(qa['question'], qa['answer'])
+            old_id = matches.get(i - 1)
+
+            if old_id is not None:
+                new_ids.append(old_id)
+                if all(existing_fields[old_id].get(name) == value for name, value in fields.items()):
+                    unchanged += 1
+                    print(f"    [{i}/{len(qa_pairs)}] = 内容未变化 (ID: {old_id})")
+                else:
+                    updates.append((i, old_id, fields))
+                continue
+
             try:
                 note_id = self.add_note(qa['question'], qa['answer'])
+                new_ids.append(note_id)
 
                 if note_id:
                     added += 1
@@ -112,17 +208,71 @@ class AnkiExporter:
                     skipped += 1
                     print(f"    [{i}/{len(qa_pairs)}] ⊘ 跳过（重复卡片）")
             except Exception as e:
+                new_ids.append(None)
                 failed += 1
                 print(f"    [{i}/{len(qa_pairs)}] ✗ 添加失败: {e}")
 
-        # 4. 返回统计
+        # 未配对的旧卡片：只有确认段落内容变化时才删除，删除成功前仍保留在索引中
+        matched_ids = set(matches.values())
+        stale_ids = [note_id for note_id in old_ids if note_id not in matched_ids]
+        index_ids = new_ids + stale_ids
+        deleted = 0
+        completed = False
+
+        try:
+            # 4. 批量更新已有卡片
+            if updates:
+                errors = self._invoke_multi([
+                    ('updateNoteFields', {'note': {'id': note_id, 'fields': fields}})
+                    for _, note_id, fields in updates
+                ])
+                for (i, note_id, _), error in zip(updates, errors):
+                    if error:
+                        failed += 1
+                        print(f"    [{i}/{len(qa_pairs)}] ✗ 更新失败: {error}")
+                    else:
+                        updated += 1
+                        print(f"    [{i}/{len(qa_pairs)}] ↻ 更新成功 (ID: {note_id})")
+
+            # 5. 删除本次不再生成的卡片
+            if stale_ids and content_hash is not None:
+                self._invoke('deleteNotes', notes=stale_ids)
+                deleted = len(stale_ids)
+                index_ids = new_ids
+                print(f"    删除 {deleted} 个过期卡片")
+            completed = True
+        finally:
+            # 即使更新/删除失败，本次已添加的卡片也要写入索引，避免下次重复添加；
+            # 未完成时不记录内容哈希，下次会重新配对
+            if use_index:
+                self.index.set(source_note_id, section, index_ids,
+                               content_hash if completed else None)
+                self.index.save()
+
+        # 6. 返回统计
         return {
             'total': len(qa_pairs),
             'added': added,
+            'updated': updated,
+            'unchanged': unchanged,
+            'deleted': deleted,
             'skipped': skipped,
             'failed': failed,
         }
 
+    def _match_existing(self, qa_pairs, old_ids, existing_fields, section_content):
+        """
+        按内容相似度把新问答对与已有卡片配对
+        返回: {问答对下标: Anki笔记ID}
+        """
+        new_texts = [f"{qa['question']}\n{qa['answer']}" for qa in qa_pairs]
+        old_texts = [
+            f"{existing_fields[note_id].get('正面', '')}\n{existing_fields[note_id].get('背面', '')}"
+            for note_id in old_ids
+        ]
+        pairs = CardScorer(section_content or '').match(new_texts, old_texts)
+        return {i: old_ids[j] for i, j in pairs.items()}
+
     def get_deck_stats(self):
         """获取牌组统计信息"""
         try:
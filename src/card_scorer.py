@@ -0,0 +1,132 @@
+"""
+卡片质量评分模块 - 本地对候选问答对打分并筛选
+"""
+import re
+
+import numpy as np
+
+
+class CardScorer:
+    def __init__(self, note_content, ngram=2, redundancy_weight=0.5,
+                 question_len=(6, 80), answer_len=(10, 400)):
+        """
+        :param note_content: 原始笔记内容，用于计算覆盖度
+        :param ngram: 字符n-gram长度（中文无空格分词，按字符切分）
+        :param redundancy_weight: 冗余惩罚权重 (0.0-1.0)
+        :param question_len: 问题的合理长度区间 (最短, 最长)
+        :param answer_len: 答案的合理长度区间 (最短, 最长)
+        """
+        self.note_content = note_content
+        self.ngram = ngram
+        self.redundancy_weight = redundancy_weight
+        self.question_len = question_len
+        self.answer_len = answer_len
+
+    def select(self, qa_pairs, num_cards):
+        """
+        从候选问答对中选出得分最高且互不重复的 num_cards 个
+        候选不足时原样返回
+        """
+        if num_cards <= 0 or len(qa_pairs) <= num_cards:
+            return qa_pairs
+
+        card_texts = [f"{qa['question']}\n{qa['answer']}" for qa in qa_pairs]
+        vectors = self._tfidf(card_texts + [self.note_content])
+        cards, note = vectors[:-1], vectors[-1]
+
+        # 覆盖度：卡片与原笔记的余弦相似度
+        coverage = cards @ note
+        # 冗余度：卡片两两之间的余弦相似度
+        similarity = cards @ cards.T
+        quality = coverage * self._length_scores(qa_pairs)
+
+        selected = self._greedy_select(quality, similarity, num_cards)
+        return [qa_pairs[i] for i in selected]
+
+    def match(self, new_texts, old_texts, min_similarity=0.4):
+        """
+        按TF-IDF相似度把新卡片与旧卡片一一配对，相似度从高到低贪心选取
+        相似度低于 min_similarity 的不配对
+        返回: {新卡片下标: 旧卡片下标}
+        """
+        if not new_texts or not old_texts:
+            return {}
+
+        vectors = self._tfidf(new_texts + old_texts)
+        similarity = vectors[:len(new_texts)] @ vectors[len(new_texts):].T
+
+        pairs = {}
+        used = set()
+        for flat in np.argsort(similarity, axis=None)[::-1]:
+            i, j = (int(k) for k in np.unravel_index(flat, similarity.shape))
+            if similarity[i, j] < min_similarity:
+                break
+            if i in pairs or j in used:
+                continue
+            pairs[i] = j
+            used.add(j)
+        return pairs
+
+    def _greedy_select(self, quality, similarity, num_cards):
+        """
+        贪心选择（MMR）：每轮选取 质量 - 与已选卡片的最大相似度 最高的卡片
+        """
+        selected = []
+        max_sim = np.zeros(len(quality))
+        available = np.ones(len(quality), dtype=bool)
+
+        for _ in range(num_cards):
+            scores = (1 - self.redundancy_weight) * quality - self.redundancy_weight * max_sim
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            available[best] = False
+            max_sim = np.maximum(max_sim, similarity[best])
+
+        # 保持LLM原有的输出顺序
+        return sorted(selected)
+
+    def _tfidf(self, texts):
+        """
+        计算字符n-gram的TF-IDF向量（L2归一化）
+        返回: shape 为 (len(texts), 词表大小) 的矩阵
+        """
+        docs = [self._ngrams(text) for text in texts]
+        vocab = {}
+        for grams in docs:
+            for gram in grams:
+                vocab.setdefault(gram, len(vocab))
+
+        tf = np.zeros((len(docs), max(len(vocab), 1)))
+        for row, grams in enumerate(docs):
+            if grams:
+                np.add.at(tf[row], [vocab[g] for g in grams], 1)
+
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log((1 + len(docs)) / (1 + df)) + 1
+        weights = tf * idf
+
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return weights / norms
+
+    def _ngrams(self, text):
+        """去除空白和标点后按字符切分n-gram"""
+        chars = re.sub(r'[\W_]+', '', text.lower())
+        if len(chars) < self.ngram:
+            return [chars] if chars else []
+        return [chars[i:i + self.ngram] for i in range(len(chars) - self.ngram + 1)]
+
+    def _length_scores(self, qa_pairs):
+        """
+        长度合理性评分：在区间内为1，超出区间按比例衰减
+        """
+        q_lens = np.array([len(qa['question']) for qa in qa_pairs], dtype=float)
+        a_lens = np.array([len(qa['answer']) for qa in qa_pairs], dtype=float)
+        return self._range_score(q_lens, *self.question_len) * self._range_score(a_lens, *self.answer_len)
+
+    @staticmethod
+    def _range_score(lengths, low, high):
+        too_short = np.clip(lengths / low, 0, 1)
+        too_long = np.clip(high / np.maximum(lengths, 1), 0, 1)
+        return too_short * too_long
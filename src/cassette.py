@@ -0,0 +1,142 @@
+"""
+录制/回放模块 - 记录Trilium、LLM、AnkiConnect的交互，用于离线复现和性能对比
+"""
+import builtins
+import gzip
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+
+import requests
+
+
+class Cassette:
+    FORMAT_VERSION = 1
+
+    def __init__(self, path, mode='record', replay_latency=False):
+        """
+        :param path: 录制文件路径（gzip压缩的JSON）
+        :param mode: 'record' 录制真实请求 / 'replay' 回放已录制的响应
+        :param replay_latency: 回放时是否按录制时的耗时等待
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"不支持的录制模式: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.interactions = []
+        # key -> 按录制顺序排列的交互，同一请求多次出现时依次回放
+        self._queues = defaultdict(deque)
+
+        if mode == 'replay':
+            self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.save()
+        return False
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """
+        与 requests.request 用法一致，返回 requests.Response
+        只有 method/url/params/json 参与匹配，请求头（含API Token）不会被录制
+        """
+        payload = {
+            'method': method,
+            'url': url,
+            'params': kwargs.get('params'),
+            'json': kwargs.get('json'),
+        }
+
+        def send():
+            response = requests.request(method, url, **kwargs)
+            return {'status': response.status_code, 'body': response.text}
+
+        recorded = self.call('http', payload, send)
+
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response._content = recorded['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+    def call(self, kind, payload, func):
+        """
+        录制模式下执行 func 并记录其（可JSON序列化的）返回值；func 抛出异常时记录异常类型和信息
+        回放模式下直接返回录制的结果，或抛出同类异常
+        """
+        key = self._key(kind, payload)
+
+        if self.mode == 'replay':
+            queue = self._queues.get(key)
+            if not queue:
+                raise Exception(f"回放记录中没有匹配的请求: {kind} {key}")
+            interaction = queue.popleft()
+            if self.replay_latency:
+                time.sleep(interaction['latency'])
+            if 'error' in interaction:
+                raise self._rebuild_error(interaction['error'])
+            return interaction['response']
+
+        interaction = {'kind': kind, 'key': key}
+        start = time.perf_counter()
+        try:
+            result = func()
+            interaction['response'] = result
+            return result
+        except Exception as e:
+            interaction['error'] = {'type': type(e).__name__, 'message': str(e)}
+            raise
+        finally:
+            interaction['latency'] = round(time.perf_counter() - start, 4)
+            self.interactions.append(interaction)
+
+    def save(self):
+        """录制模式下写入文件，回放模式下不做任何事"""
+        if self.mode != 'record':
+            return
+
+        data = {'version': self.FORMAT_VERSION, 'interactions': self.interactions}
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            raise Exception(f"读取录制文件失败: {e}")
+
+        if data.get('version') != self.FORMAT_VERSION:
+            raise Exception(f"不支持的录制文件版本: {data.get('version')}")
+
+        self.interactions = data['interactions']
+        for interaction in self.interactions:
+            self._queues[interaction['key']].append(interaction)
+
+    @staticmethod
+    def _rebuild_error(error):
+        """
+        按录制的异常类型名重建异常：requests 异常和内置异常还原为同一类型，
+        其他（如 openai 的异常，构造参数不同）还原为 Exception
+        """
+        exc_type = getattr(requests.exceptions, error['type'], None) or getattr(builtins, error['type'], None)
+        if not (isinstance(exc_type, type) and issubclass(exc_type, Exception)):
+            return Exception(f"{error['type']}: {error['message']}")
+        return exc_type(error['message'])
+
+    @staticmethod
+    def _key(kind, payload):
+        raw = json.dumps([kind, payload], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
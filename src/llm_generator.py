@@ -1,13 +1,17 @@
 """
 LLM问答生成模块
 """
+import math
+
 from openai import OpenAI
 
+from src.card_scorer import CardScorer
 from src.prompt import llm_prompt
 
 
 class LLMGenerator:
-    def __init__(self, api_base, api_key, model, temperature=0.7, max_tokens=2000):
+    def __init__(self, api_base, api_key, model, temperature=0.7, max_tokens=2000,
+                 oversample_ratio=1.5, cassette=None):
         # 使用自定义API地址
         self.client = OpenAI(
             api_key=api_key,
@@ -16,30 +20,56 @@ class LLMGenerator:
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        # 多生成一部分候选卡片，再在本地评分筛选（1.0 表示不多生成）
+        self.oversample_ratio = oversample_ratio
+        # 传入 Cassette 时通过它录制/回放LLM调用
+        self.cassette = cassette
 
     def generate_qa_pairs(self, note_content, num_cards=5, difficulty="适中"):
         """
         根据笔记内容生成问答对
+        num_cards > 0 时一次性多生成候选，再本地评分保留得分最高的 num_cards 个
         """
-        prompt = self._build_prompt(note_content, num_cards, difficulty)
+        request_cards = num_cards
+        if num_cards > 0 and self.oversample_ratio > 1:
+            request_cards = math.ceil(num_cards * self.oversample_ratio)
+
+        prompt = self._build_prompt(note_content, request_cards, difficulty)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "你是一个专业的Anki卡片制作助手，擅长根据学习笔记生成高质量的问答对。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-
-            result = response.choices[0].message.content
-            return self._parse_qa_pairs(result)
+            result = self._chat(prompt)
+            qa_pairs = self._parse_qa_pairs(result)
 
         except Exception as e:
             raise Exception(f"LLM调用失败: {e}")
 
+        # LLM 返回的数量常常多于要求，不多生成时也要截断到 num_cards
+        if num_cards > 0:
+            qa_pairs = CardScorer(note_content).select(qa_pairs, num_cards)
+        return qa_pairs
+
+    def _chat(self, prompt):
+        """
+        调用LLM，返回回复文本
+        """
+        request = {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": "你是一个专业的Anki卡片制作助手，擅长根据学习笔记生成高质量的问答对。"},
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+        }
+
+        def send():
+            response = self.client.chat.completions.create(**request)
+            return response.choices[0].message.content
+
+        if self.cassette is None:
+            return send()
+        return self.cassette.call('chat', request, send)
+
     def _build_prompt(self, note_content, num_cards, difficulty):
         """
         构建提示词
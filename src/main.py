@@ -3,12 +3,15 @@
 """
 import os
 import sys
+from datetime import datetime
+
 import yaml
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.anki_exporter import AnkiExporter
+from src.cassette import Cassette
 from src.content_parser import ContentParser
 from src.llm_generator import LLMGenerator
 from src.trilium_fetcher import TriliumFetcher
@@ -26,6 +29,35 @@ def load_config(config_path=None):
         return yaml.safe_load(f)
 
 
+def build_cassette(config):
+    """
+    根据配置创建录制/回放器
+    未配置或 mode 为 off 时返回 None
+    """
+    cassette_config = config.get('cassette') or {}
+    mode = cassette_config.get('mode', 'off')
+    if mode == 'off':
+        return None
+
+    return Cassette(
+        path=cassette_config.get('path', 'cassette.json.gz'),
+        mode=mode,
+        replay_latency=cassette_config.get('replay_latency', False)
+    )
+
+
+def resolve_target_date(cassette=None):
+    """
+    确定本次运行的目标日期
+    录制时写入录制文件，回放时使用录制当天的日期，保证请求与录制时一致
+    """
+    if cassette is None:
+        return datetime.now()
+
+    recorded = cassette.call('target_date', {}, lambda: datetime.now().isoformat())
+    return datetime.fromisoformat(recorded)
+
+
 def main():
     print("=" * 50)
     print("Trilium笔记 → Anki卡片 自动生成工具")
@@ -35,11 +67,26 @@ def main():
     print("\n[1/6] 加载配置...")
     config = load_config()
 
+    cassette = build_cassette(config)
+    if cassette is None:
+        run(config)
+        return
+
+    print(f"[CASSETTE] {cassette.mode}: {cassette.path}")
+    with cassette:
+        run(config, cassette)
+
+
+def run(config, cassette=None):
+    """执行 获取笔记 → 生成问答对 → 添加到Anki 的流程"""
+    target_date = resolve_target_date(cassette)
+
     # 2. 连接Trilium
     print("[2/6] 连接Trilium服务器...")
     fetcher = TriliumFetcher(
         server_url=config['trilium']['server_url'],
-        api_token=config['trilium']['api_token']
+        api_token=config['trilium']['api_token'],
+        cassette=cassette
     )
 
     try:
@@ -55,7 +102,10 @@ def main():
     try:
         note_result = fetcher.fetch_today_content(
             model=config['trilium']['fetch_mode'],
-            note_id=config['trilium'].get('note_id')
+            note_id=config['trilium'].get('note_id'),
+            search_template=config['trilium'].get('search_template'),
+            ancestor_note_id=config['trilium'].get('search_ancestor_note_id'),
+            target_date=target_date
         )
     except Exception as e:
         print(f"[ERROR] 获取失败: {e}")
@@ -70,16 +120,18 @@ def main():
     # 4. 解析内容
     print("[4/6] 解析笔记内容...")
     content = note_result['content']
+    section = ''
 
     if note_result.get('is_full_doc'):
         parser = ContentParser(content)
-        today_section = parser.extract_today_section()
+        today_section = parser.extract_today_section(target_date)
 
         if not today_section:
             print("[ERROR] 在文档中未找到今天的日期标题")
             return
 
         content = today_section['content']
+        section = today_section['date']
         print(f"[OK] 提取成功: {today_section['date']}")
 
     # 清理HTML
@@ -100,7 +152,9 @@ def main():
         api_key=config['llm']['api_key'],
         model=config['llm']['model'],
         temperature=config['llm']['temperature'],
-        max_tokens=config['llm']['max_tokens']
+        max_tokens=config['llm']['max_tokens'],
+        oversample_ratio=config['generation'].get('oversample_ratio', 1.5),
+        cassette=cassette
     )
 
     try:
@@ -132,11 +186,18 @@ def main():
         deck_name=config['anki']['deck_name'],
         ankiconnect_url=config['anki']['ankiconnect_url'],
         model_name=config['anki']['model_name'],
-        tags=config['anki']['tags']
+        tags=config['anki']['tags'],
+        cassette=cassette,
+        index_path=config['anki'].get('index_path')
     )
 
     try:
-        stats = exporter.export(qa_pairs)
+        stats = exporter.export(
+            qa_pairs,
+            source_note_id=note_result['noteId'],
+            section=section,
+            section_content=content
+        )
 
         print("\n" + "=" * 50)
         print("任务完成！")
@@ -144,6 +205,9 @@ def main():
         print(f"\n[STATS] 统计信息:")
         print(f"  总卡片数: {stats['total']}")
         print(f"  [OK] 成功添加: {stats['added']}")
+        print(f"  [OK] 原地更新: {stats['updated']}")
+        print(f"  [OK] 内容未变化: {stats['unchanged']}")
+        print(f"  [OK] 删除过期: {stats['deleted']}")
         print(f"  [SKIP] 跳过重复: {stats['skipped']}")
         print(f"  [ERROR] 添加失败: {stats['failed']}")
 
@@ -0,0 +1,67 @@
+"""
+卡片映射索引模块 - 记录 (Trilium笔记, 段落, 卡片序号) → Anki笔记ID
+"""
+import copy
+import hashlib
+import json
+import os
+
+
+class NoteIndex:
+    def __init__(self, path=None, data=None):
+        """
+        :param path: 索引文件路径（JSON），不存在时视为空索引；为None时只在内存中保存
+        :param data: 直接使用的初始数据（会复制一份），提供时不读取文件
+        结构: {noteId: {section: {'hash': 段落内容哈希, 'notes': [ankiNoteId 或 None, ...]}}}
+        notes 的下标即卡片序号；旧版本直接保存ID列表，读取时视为哈希未知
+        """
+        self.path = path
+        self.data = {}
+
+        if data is not None:
+            self.data = copy.deepcopy(data)
+        elif path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except Exception as e:
+                raise Exception(f"读取卡片索引失败: {e}")
+
+    @staticmethod
+    def hash_content(content):
+        """段落内容哈希，content 为None时返回None"""
+        if content is None:
+            return None
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get(self, note_id, section=''):
+        """返回该段落各卡片序号对应的Anki笔记ID列表"""
+        return list(self._entry(note_id, section)['notes'])
+
+    def get_hash(self, note_id, section=''):
+        """返回上次导出时该段落的内容哈希，未知时返回None"""
+        return self._entry(note_id, section)['hash']
+
+    def set(self, note_id, section, anki_note_ids, content_hash=None):
+        """覆盖该段落的映射，全部为空时移除"""
+        sections = self.data.setdefault(note_id, {})
+        if any(anki_note_ids):
+            sections[section] = {'hash': content_hash, 'notes': list(anki_note_ids)}
+        else:
+            sections.pop(section, None)
+            if not sections:
+                self.data.pop(note_id, None)
+
+    def _entry(self, note_id, section):
+        entry = self.data.get(note_id, {}).get(section)
+        if isinstance(entry, list):
+            return {'hash': None, 'notes': entry}
+        return entry or {'hash': None, 'notes': []}
+
+    def save(self):
+        """写入索引文件，内存索引不做任何事"""
+        if self.path is None:
+            return
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
@@ -2,22 +2,24 @@
 Trilium笔记获取模块
 """
 import requests
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 
 class TriliumFetcher:
-    def __init__(self, server_url, api_token):
+    def __init__(self, server_url, api_token, cassette=None):
         self.server_url = server_url.rstrip('/')
         self.api_base = f"{self.server_url}/etapi"
         self.headers = {
             'Authorization': api_token,
             'Content-Type': 'application/json'
         }
+        # 传入 Cassette 时通过它录制/回放请求
+        self.http = cassette if cassette is not None else requests
 
     def test_connection(self):
         """测试连接"""
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_base}/app-info",
                 headers=self.headers,
                 timeout=10
@@ -33,7 +35,7 @@ class TriliumFetcher:
         返回: {'noteId', 'title', 'type', ...}
         """
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_base}/notes/{note_id}",
                 headers=self.headers,
                 timeout=10
@@ -50,7 +52,7 @@ class TriliumFetcher:
         :return: 文本内容或HTML内容
         """
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_base}/notes/{note_id}/content",
                 headers=self.headers,
                 timeout=10
@@ -60,15 +62,17 @@ class TriliumFetcher:
         except Exception as e:
             raise Exception(f"获取笔记内容失败: {e}")
 
-    def get_calendar_note(self, date=None):
+    def get_calendar_note(self, target_date=None):
         """
         获取指定日期的笔记
-        date: datetime对象,默认为今天
+        target_date: datetime对象,默认为今天
         """
-        date_str = date.strftime("%Y-%m-%d")
+        if target_date is None:
+            target_date = datetime.now()
+        date_str = target_date.strftime("%Y-%m-%d")
 
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_base}/calendar/days/{date_str}",
                 headers=self.headers,
                 timeout=10
@@ -88,15 +92,78 @@ class TriliumFetcher:
         except Exception as e:
             raise Exception(f"获取日历笔记失败: {e}")
 
-    def search_notes(self, query):
+    def build_search_query(self, text=None, labels=None, created_from=None, created_to=None,
+                           modified_from=None, modified_to=None):
+        """
+        构建Trilium搜索表达式，过滤条件交给服务端执行
+        text: 全文搜索关键词
+        labels: {'标签名': 值}，值为 True 表示只要求存在该标签
+        created_from/created_to/modified_from/modified_to: datetime/date对象或字符串，区间两端均包含
+            （上界为date对象时包含当天全天；字符串按Trilium的字符串比较原样使用）
+        返回: 如 "Python #book note.dateCreated >= '2025-11-01'"
+        """
+        parts = []
+        if text:
+            parts.append(text)
+
+        for name, value in (labels or {}).items():
+            if value is True:
+                parts.append(f"#{name}")
+            else:
+                parts.append(f"#{name}={self._quote(value)}")
+
+        date_filters = [
+            ('note.dateCreated', '>=', created_from),
+            ('note.dateCreated', '<=', created_to),
+            ('note.dateModified', '>=', modified_from),
+            ('note.dateModified', '<=', modified_to),
+        ]
+        for prop, op, value in date_filters:
+            if value is None:
+                continue
+            # Trilium 按字符串比较 '2025-11-30 10:00:00.000+0800'，它并不 <= '2025-11-30'
+            # 所以 date 上界改为 < 次日
+            if op == '<=' and isinstance(value, date) and not isinstance(value, datetime):
+                op, value = '<', value + timedelta(days=1)
+            parts.append(f"{prop} {op} {self._quote(self._format_date(value))}")
+
+        if not parts:
+            raise ValueError("搜索条件不能为空")
+        return ' '.join(parts)
+
+    def search_notes(self, query, ancestor_note_id=None, fast_search=False, order_by=None,
+                     order_direction=None, limit=None, include_archived=False):
         """
         搜索笔记
+        query: 搜索表达式，可用 build_search_query 构建
+        ancestor_note_id: 只搜索该笔记的子树
+        fast_search: 只匹配标题和属性，不搜索正文
+        order_by/order_direction: 如 'dateModified' / 'desc'
+        limit: 最多返回的结果数，必须同时指定 order_by
+            （Trilium 只在按非相关度排序时应用 limit，否则会忽略它并返回全部结果）
         返回:[{'noteId', 'title', ...},...]
         """
+        if limit and not order_by:
+            raise ValueError("limit 需要同时指定 order_by，否则Trilium会忽略limit")
+
+        params = {'search': query}
+        if ancestor_note_id:
+            params['ancestorNoteId'] = ancestor_note_id
+        if fast_search:
+            params['fastSearch'] = 'true'
+        if include_archived:
+            params['includeArchivedNotes'] = 'true'
+        if order_by:
+            params['orderBy'] = order_by
+        if order_direction:
+            params['orderDirection'] = order_direction
+        if limit:
+            params['limit'] = limit
+
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_base}/notes",
-                params={'search': query},
+                params=params,
                 headers=self.headers,
                 timeout=10
             )
@@ -106,12 +173,44 @@ class TriliumFetcher:
         except Exception as e:
             raise Exception(f"搜索笔记失败: {e}")
 
-    def fetch_today_content(self, model='fixed_note', note_id=None, search_template=None):
+    def search_modified_since(self, since, ancestor_note_id=None, limit=None):
+        """
+        获取指定时间之后修改过的笔记，按修改时间倒序
+        since: 上次同步时间（datetime对象或字符串）
+        """
+        query = self.build_search_query(modified_from=since)
+        return self.search_notes(
+            query,
+            ancestor_note_id=ancestor_note_id,
+            order_by='dateModified',
+            order_direction='desc',
+            limit=limit
+        )
+
+    @staticmethod
+    def _format_date(value):
+        """datetime → 'YYYY-MM-DD HH:MM:SS'，date → 'YYYY-MM-DD'，字符串原样返回"""
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(value, date):
+            return value.strftime("%Y-%m-%d")
+        return str(value)
+
+    @staticmethod
+    def _quote(value):
+        """给搜索表达式中的值加引号"""
+        value = str(value).replace('\\', '\\\\').replace("'", "\\'")
+        return f"'{value}'"
+
+    def fetch_today_content(self, model='fixed_note', note_id=None, search_template=None,
+                            ancestor_note_id=None, target_date=None):
         """
         获取今天的笔记内容
         mode: 'calendar' / 'search' / 'fixed_note'
+        ancestor_note_id: search 模式下只在该笔记的子树中搜索
+        target_date: datetime对象,默认为今天
         """
-        today = datetime.now()
+        today = target_date or datetime.now()
 
         if model == 'calendar':
             # 方式1： 使用日历笔记功能
@@ -126,9 +225,16 @@ class TriliumFetcher:
             date_str = today.strftime("%Y年%m月%d日")
             query = search_template.replace("{date}", date_str)
 
-            results = self.search_notes(query)
+            # 按创建时间倒序取一条，limit 只有在指定 orderBy 时才会在服务端生效
+            results = self.search_notes(
+                query,
+                ancestor_note_id=ancestor_note_id,
+                order_by='dateCreated',
+                order_direction='desc',
+                limit=1
+            )
             if results:
-                # 返回第一个结果
+                # 返回最新创建的匹配笔记
                 first_note = results[0]
                 content = self.get_note_contents(first_note['noteId'])
                 return {